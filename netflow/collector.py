@@ -37,17 +37,37 @@ logger.addHandler(ch)
 
 
 class QueuingRequestHandler(socketserver.BaseRequestHandler):
+    # Maximum number of datagrams read per request, see handle()
+    batch_size = 64
+
     def handle(self):
-        data = self.request[0]  # get content, [1] would be the socket
-        self.server.queue.put(RawPacket(time.time(), self.client_address, data))
+        data, sock = self.request  # content and the socket it was received on
+        self._queue(data, self.client_address)
+
+        # Bursts of exports can fill the socket receive buffer faster than the server loop polls the socket
+        # for each single datagram. Drain datagrams which are already waiting without blocking, up to batch_size.
+        if not hasattr(socket, "MSG_DONTWAIT"):  # not available on all platforms
+            return
+        for _ in range(self.batch_size - 1):
+            try:
+                data, client_address = sock.recvfrom(self.server.max_packet_size, socket.MSG_DONTWAIT)
+            except OSError:  # BlockingIOError if no datagram is waiting
+                break
+            self._queue(data, client_address)
+
+    def _queue(self, data, client_address):
+        self.server.queue.put(RawPacket(time.time(), client_address, data))
         logger.debug(
-            "Received %d bytes of data from %s", len(data), self.client_address
+            "Received %d bytes of data from %s", len(data), client_address
         )
 
 
-class QueuingUDPListener(socketserver.ThreadingUDPServer):
-    """A threaded UDP server that adds a (time, data) tuple to a queue for
-    every request it sees
+class QueuingUDPListener(socketserver.UDPServer):
+    """A UDP server that adds a (time, data) tuple to a queue for
+    every request it sees.
+
+    Requests are handled in the thread running serve_forever. Handling only
+    puts the datagram into the queue, so a thread per request is not needed.
     """
 
     def __init__(self, interface, queue):
@@ -89,13 +109,18 @@ class ThreadedNetFlowListener(threading.Thread):
     """
 
     def __init__(self, host: str, port: int):
-        logger.info("Starting the NetFlow listener on {}:{}".format(host, port))
+        logger.info("Starting the NetFlow listener on %s:%d", host, port)
         self.output = queue.Queue()
         self.input = queue.Queue()
         self.server = QueuingUDPListener((host, port), self.input)
         self.thread = threading.Thread(target=self.server.serve_forever)
         self.thread.start()
         self._shutdown = threading.Event()
+
+        # Processing state, templates are passed as reference and updated when parsing v9 and IPFIX exports
+        # TODO: use per-client templates
+        self.templates = {"netflow": {}, "ipfix": {}}
+        self.to_retry = []  # v9/IPFIX packets waiting for their template
         super().__init__()
 
     def get(self, block=True, timeout=None) -> ParsedPacket:
@@ -114,9 +139,6 @@ class ThreadedNetFlowListener(threading.Thread):
     def run(self):
         # Process packets from the queue
         try:
-            # TODO: use per-client templates
-            templates = {"netflow": {}, "ipfix": {}}
-            to_retry = []
             while not self._shutdown.is_set():
                 try:
                     # 0.5s delay to limit CPU usage while waiting for new packets
@@ -125,42 +147,49 @@ class ThreadedNetFlowListener(threading.Thread):
                     continue
 
                 try:
-                    # templates is passed as reference, updated in V9ExportPacket
-                    export = parse_packet(pkt.data, templates)
-                except UnknownExportVersion as e:
-                    logger.error("%s, ignoring the packet", e)
-                    continue
-                except (V9TemplateNotRecognized, IPFIXTemplateNotRecognized):
-                    # TODO: differentiate between v9 and IPFIX, use separate to_retry lists
-                    if time.time() - pkt.ts > PACKET_TIMEOUT:
-                        logger.warning("Dropping an old and undecodable v9/IPFIX ExportPacket")
-                    else:
-                        to_retry.append(pkt)
-                        logger.debug("Failed to decode a v9/IPFIX ExportPacket - will "
-                                     "re-attempt when a new template is discovered")
-                    continue
-
-                if export.header.version == 10:
-                    logger.debug("Processed an IPFIX ExportPacket with length %d.", export.header.length)
-                else:
-                    logger.debug("Processed a v%d ExportPacket with %d flows.",
-                                 export.header.version, export.header.count)
-
-                # If any new templates were discovered, dump the unprocessable
-                # data back into the queue and try to decode them again
-                if export.header.version in [9, 10] and export.contains_new_templates and to_retry:
-                    logger.debug("Received new template(s)")
-                    logger.debug("Will re-attempt to decode %d old v9/IPFIX ExportPackets", len(to_retry))
-                    for p in to_retry:
-                        self.input.put(p)
-                    to_retry.clear()
-
-                self.output.put(ParsedPacket(pkt.ts, pkt.client, export))
+                    self._process(pkt)
+                finally:
+                    # Mark the packet as handled, so that input.join() can be used to wait for processing
+                    self.input.task_done()
         finally:
             # Only reached when while loop ends
             self.server.shutdown()
             self.server.server_close()
 
+    def _process(self, pkt: RawPacket):
+        try:
+            # templates is passed as reference, updated in V9ExportPacket
+            export = parse_packet(pkt.data, self.templates)
+        except UnknownExportVersion as e:
+            logger.error("%s, ignoring the packet", e)
+            return
+        except (V9TemplateNotRecognized, IPFIXTemplateNotRecognized):
+            # TODO: differentiate between v9 and IPFIX, use separate to_retry lists
+            if time.time() - pkt.ts > PACKET_TIMEOUT:
+                logger.warning("Dropping an old and undecodable v9/IPFIX ExportPacket")
+            else:
+                self.to_retry.append(pkt)
+                logger.debug("Failed to decode a v9/IPFIX ExportPacket - will "
+                             "re-attempt when a new template is discovered")
+            return
+
+        if export.header.version == 10:
+            logger.debug("Processed an IPFIX ExportPacket with length %d.", export.header.length)
+        else:
+            logger.debug("Processed a v%d ExportPacket with %d flows.",
+                         export.header.version, export.header.count)
+
+        # If any new templates were discovered, dump the unprocessable
+        # data back into the queue and try to decode them again
+        if export.header.version in [9, 10] and export.contains_new_templates and self.to_retry:
+            logger.debug("Received new template(s)")
+            logger.debug("Will re-attempt to decode %d old v9/IPFIX ExportPackets", len(self.to_retry))
+            for p in self.to_retry:
+                self.input.put(p)
+            self.to_retry.clear()
+
+        self.output.put(ParsedPacket(pkt.ts, pkt.client, export))
+
     def stop(self):
         logger.info("Shutting down the NetFlow listener")
         self._shutdown.set()
@@ -174,7 +203,7 @@ def get_export_packets(host: str, port: int) -> ParsedPacket:
     """A threaded generator that will yield ExportPacket objects until it is killed
     """
     def handle_signal(s, f):
-        logger.debug("Received signal {}, raising StopIteration".format(s))
+        logger.debug("Received signal %s, raising StopIteration", s)
         raise StopIteration
     signal.signal(signal.SIGTERM, handle_signal)
     signal.signal(signal.SIGINT, handle_signal)
@@ -715,18 +715,22 @@ class IPFIXDataRecord:
     In contrast to the NetFlow v9 implementation, this one does not use an extra class for the fields.
     """
 
-    def __init__(self, data, template: List[Union[TemplateField, TemplateFieldEnterprise]]):
-        self.fields = set()
-        offset = 0
+    @staticmethod
+    @functools.lru_cache(maxsize=128)
+    def get_unpacker(template: tuple) -> (struct.Struct, tuple):
+        """
+        Build the struct unpacker for data records of a template.
+        :param template: Tuple of the template fields, hashable to be usable as cache key.
+        :return: The unpacker and a tuple of (datatype, field_type_id) tuples, one per field.
+        """
         unpacker = "!"
         discovered_fields = []
 
         # Iterate through all fields of this template and build the unpack format string
         # See https://www.iana.org/assignments/ipfix/ipfix.xhtml
-        for index, field in enumerate(template):
+        for field in template:
             field_type_id = field.id
             field_length = field.length
-            offset += field_length
 
             # Here, reduced-size encoding of fields blocks the usage of IPFIXFieldTypes.get_type_unpack.
             # See comment in IPFIXFieldTypes.get_type_unpack for more information.
@@ -761,8 +765,18 @@ class IPFIXDataRecord:
             else:
                 raise IPFIXTemplateError("Template field_length {} not handled in unpacker".format(field_length))
 
-        # Finally, unpack the data byte stream according to format defined in iteration above
-        pack = struct.unpack(unpacker, data[0:offset])
+        return struct.Struct(unpacker), tuple(discovered_fields)
+
+    def __init__(self, data, template: List[Union[TemplateField, TemplateFieldEnterprise]]):
+        self.fields = set()
+
+        # The unpack format only depends on the template, so it is built once per template and then re-used
+        # for all data records of this template. A changed template results in a different cache key.
+        unpacker, discovered_fields = self.get_unpacker(tuple(template))
+        offset = unpacker.size
+
+        # Finally, unpack the data byte stream according to format defined by the template
+        pack = unpacker.unpack(data[0:offset])
 
         # Iterate through template again, but taking the unpacked values this time
         for index, ((field_datatype, field_type_id), value) in enumerate(zip(discovered_fields, pack)):
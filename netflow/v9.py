@@ -12,9 +12,9 @@ Copyright 2016-2020 Dominik Pataky <software+pynetflow@dpataky.eu>
 Licensed under MIT License. See LICENSE.
 """
 
+import functools
 import ipaddress
 import struct
-import sys
 
 from .ipfix import IPFIXFieldTypes, IPFIXDataTypes
 
@@ -207,29 +207,16 @@ class V9DataFlowSet:
         # As the field lengths are variable V9 has padding to next 32 Bit
         padding_size = 4 - (self.length % 4)  # 4 Byte
 
-        # For performance reasons, we use struct.unpack to get individual values. Here
-        # we prepare the format string for parsing it. The format string is based on the template fields and their
-        # lengths. The string can then be re-used for every data record in the data stream
-        struct_format = '!'
-        struct_len = 0
-        for field in template.fields:
-            # The length of the value byte slice is defined in the template
-            flen = field.field_length
-            if flen == 4:
-                struct_format += 'L'
-            elif flen == 2:
-                struct_format += 'H'
-            elif flen == 1:
-                struct_format += 'B'
-            else:
-                struct_format += '%ds' % flen
-            struct_len += flen
+        # The unpacker is built once per template format and then cached, see V9TemplateRecord
+        unpacker = template.get_unpacker(template.struct_format)
+        struct_len = unpacker.size
 
-        while offset <= (self.length - padding_size):
-            # Here we actually unpack the values, the struct format string is used in every data record
-            # iteration, until the final offset reaches the end of the whole data stream
-            unpacked_values = struct.unpack(struct_format, data[offset:offset + struct_len])
+        # All data records in this flowset share the same layout. Instead of unpacking record by record, the
+        # values of all records are unpacked in one pass over the data stream, up to the start of the padding
+        record_count = max(0, (self.length - padding_size - offset) // struct_len + 1)
+        records_end = offset + record_count * struct_len
 
+        for unpacked_values in unpacker.iter_unpack(data[offset:records_end]):
             new_record = V9DataRecord()
             for field, value in zip(template.fields, unpacked_values):
                 flen = field.field_length
@@ -244,20 +231,12 @@ class V9DataFlowSet:
                         print("IP address could not be parsed: {}".format(repr(value)))
                         continue
                     new_record.data[fkey] = ip.compressed
-                elif flen in (1, 2, 4):
+                elif flen in (1, 2, 4, 8):
                     # These values are already converted to numbers by struct.unpack:
                     new_record.data[fkey] = value
                 else:
-                    # Caveat: this code assumes little-endian system (like x86)
-                    if sys.byteorder != "little":
-                        print("v9.py uses bit shifting for little endianness. Your processor is not little endian")
-
-                    fdata = 0
-                    for idx, byte in enumerate(reversed(bytearray(value))):
-                        fdata += byte << (idx * 8)
-                    new_record.data[fkey] = fdata
-
-                offset += flen
+                    # Other lengths (e.g. MAC addresses) are unpacked as bytes, in network byte order
+                    new_record.data[fkey] = int.from_bytes(value, "big")
 
             new_record.__dict__.update(new_record.data)
             self.flows.append(new_record)
@@ -289,6 +268,36 @@ class V9TemplateRecord:
         self.field_count = field_count
         self.fields = fields
 
+        # For performance reasons, we use struct.unpack to get individual values. Here
+        # we prepare the format string for parsing it. The format string is based on the template fields and their
+        # lengths. It is built once per template and then re-used for every data record referencing this template
+        struct_format = '!'
+        for field in fields:
+            # The length of the value byte slice is defined in the template
+            flen = field.field_length
+            if flen == 8:
+                struct_format += 'Q'
+            elif flen == 4:
+                struct_format += 'L'
+            elif flen == 2:
+                struct_format += 'H'
+            elif flen == 1:
+                struct_format += 'B'
+            else:
+                struct_format += '%ds' % flen
+        # Only the format string is stored, so templates stay picklable and can be copied
+        self.struct_format = struct_format
+
+    @staticmethod
+    @functools.lru_cache(maxsize=128)
+    def get_unpacker(struct_format: str) -> struct.Struct:
+        """
+        Build the struct unpacker for data records of a template.
+        :param struct_format: The format string of the template, used as cache key.
+        :return: The compiled struct.Struct for this format.
+        """
+        return struct.Struct(struct_format)
+
     def __repr__(self):
         return "<TemplateRecord {} with {} fields: {}>".format(
             self.template_id, self.field_count,
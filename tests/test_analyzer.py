@@ -7,6 +7,7 @@ Copyright 2016-2020 Dominik Pataky <software+pynetflow@dpataky.eu>
 Licensed under MIT License. See LICENSE.
 """
 import gzip
+import io
 import json
 import subprocess
 import sys
@@ -25,15 +26,20 @@ class TestFlowExportAnalyzer(unittest.TestCase):
         pkts, _, _ = send_recv_packets([PACKET_V9_TEMPLATE, *PACKETS_V9])
 
         # Now the pkts must be transformed from their data structure to the "gzipped JSON representation",
-        # which the collector uses for persistant storage.
-        data_dicts = []  # list holding all entries
-        for p in pkts:  # each pkt has its own entry with timestamp as key
-            data_dicts.append({p.ts: {
-                "client": p.client,
-                "header": p.export.header.to_dict(),
-                "flows": [f.data for f in p.export.flows]
-            }})
-        data = "\n".join([json.dumps(dd) for dd in data_dicts])  # join all entries together by newlines
+        # which the collector uses for persistant storage. Each entry is streamed into the gzip writer as its
+        # own line, without building the whole document in memory first.
+        num_flows = 0
+        buffer = io.BytesIO()
+        with gzip.GzipFile(fileobj=buffer, mode="wb") as gz:
+            for p in pkts:  # each pkt has its own entry with timestamp as key
+                flows = [f.data for f in p.export.flows]
+                num_flows += len(flows)
+                gz.write(json.dumps({p.ts: {
+                    "client": p.client,
+                    "header": p.export.header.to_dict(),
+                    "flows": flows
+                }}).encode())  # encode to unicode
+                gz.write(b"\n")  # entries are separated by newlines
 
         # Different stdout/stderr arguments for backwards compatibility
         pipe_output_param = {"capture_output": True}
@@ -44,7 +50,7 @@ class TestFlowExportAnalyzer(unittest.TestCase):
             }
 
         # Analyzer takes gzipped input either via stdin or from a file (here: stdin)
-        gzipped_input = gzip.compress(data.encode())  # encode to unicode
+        gzipped_input = buffer.getvalue()
 
         # Run analyzer as CLI script with no packets ignored (parameter)
         analyzer = subprocess.run(
@@ -58,7 +64,6 @@ class TestFlowExportAnalyzer(unittest.TestCase):
         self.assertEqual(analyzer.stderr, b"", analyzer.stderr.decode())
 
         # Every 2 flows are written as a single line (any extras are dropped)
-        num_flows = sum(len(list(item.values())[0]["flows"]) for item in data_dicts)
         self.assertEqual(len(analyzer.stdout.splitlines()) - 2, num_flows // 2)  # ignore two header lines
 
 
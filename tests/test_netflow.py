@@ -6,29 +6,45 @@ This file belongs to https://github.com/bitkeks/python-netflow-v9-softflowd.
 Copyright 2016-2020 Dominik Pataky <software+pynetflow@dpataky.eu>
 Licensed under MIT License. See LICENSE.
 """
-# TODO: tests with 500 packets fail with delay=0. Probably a problem with UDP sockets buffer
-
+import copy
 import ipaddress
-import random
+import pickle
 import unittest
 
-from tests.lib import send_recv_packets, NUM_PACKETS, \
+from netflow import parse_packet
+from tests.lib import CollectorHarness, NUM_PACKETS, RNG, RNG_SEED, \
     PACKET_INVALID, PACKET_V1, PACKET_V5, PACKET_V9_WITH_ZEROS, \
-    PACKET_V9_TEMPLATE, PACKET_V9_TEMPLATE_MIXED, PACKETS_V9
+    PACKET_V9_TEMPLATE, PACKET_V9_TEMPLATE_MIXED, PACKETS_V9, \
+    V9_HEADER, V9_TEMPLATE_1024, V9_TEMPLATE_2048, V9_FLOWS_1024, build_v9
+
+# Flows contain IPv4 addresses as integers, so expected addresses are converted once
+_IP_172_17_0_1 = int(ipaddress.IPv4Address("172.17.0.1"))
+_IP_172_17_0_2 = int(ipaddress.IPv4Address("172.17.0.2"))
 
 
 class TestFlowExportNetflow(unittest.TestCase):
-    def _test_recv_all_packets(self, num, template_idx, delay=0.0001):
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.harness = CollectorHarness()
+        cls.harness.start()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.harness.stop()
+
+    def setUp(self) -> None:
+        RNG.seed(RNG_SEED)
+
+    def _test_recv_all_packets(self, num, template_idx, delay=0):
         """Fling packets at the server and test that it receives them all"""
 
         def gen_pkts(n, idx):
-            for x in range(n):
-                if x == idx:
-                    yield PACKET_V9_TEMPLATE
-                else:
-                    yield random.choice(PACKETS_V9)
+            # Picked up front, so the sender gets a complete list instead of calling into the RNG per packet
+            pkts = [RNG.choice(PACKETS_V9) for _ in range(n)]
+            pkts[idx] = PACKET_V9_TEMPLATE
+            return pkts
 
-        pkts, tstart, tend = send_recv_packets(gen_pkts(num, template_idx), delay=delay)
+        pkts, tstart, tend = self.harness.run(gen_pkts(num, template_idx), delay=delay)
 
         # check number of packets
         self.assertEqual(len(pkts), num)
@@ -36,15 +52,21 @@ class TestFlowExportNetflow(unittest.TestCase):
         # check timestamps are when packets were sent, not processed
         self.assertTrue(all(tstart < p.ts < tend for p in pkts))
 
+        # count "things" (flows + templates) and flows in a single pass over all packets
+        counts_total = flows_total = 0
+        for p in pkts:
+            counts_total += p.export.header.count
+            flows_total += len(p.export.flows)
+
         # check number of "things" in the packets (flows + templates)
         # template packet = 10 things
         # other packets = 12 things
-        self.assertEqual(sum(p.export.header.count for p in pkts), (num - 1) * 12 + 10)
+        self.assertEqual(counts_total, (num - 1) * 12 + 10)
 
         # check number of flows in the packets
         # template packet = 8 flows (2 templates)
         # other packets = 12 flows
-        self.assertEqual(sum(len(p.export.flows) for p in pkts), (num - 1) * 12 + 8)
+        self.assertEqual(flows_total, (num - 1) * 12 + 8)
 
     def test_recv_all_packets_template_first(self):
         """Test all packets are received when the template is sent first"""
@@ -60,20 +82,21 @@ class TestFlowExportNetflow(unittest.TestCase):
 
     def test_recv_all_packets_slowly(self):
         """Test all packets are received when things are sent slooooowwwwwwwwlllllllyyyyyy"""
-        self._test_recv_all_packets(3, 0, delay=1)
+        # Sent one by one with a pause in between, so the listener sees every packet on its own
+        self._test_recv_all_packets(3, 0, delay=0.1)
 
     def test_ignore_invalid_packets(self):
         """Test that invalid packets log a warning but are otherwise ignored"""
         with self.assertLogs(level='WARNING'):
-            pkts, _, _ = send_recv_packets([
-                PACKET_INVALID, PACKET_V9_TEMPLATE, random.choice(PACKETS_V9), PACKET_INVALID,
-                random.choice(PACKETS_V9), PACKET_INVALID
+            pkts, _, _ = self.harness.run([
+                PACKET_INVALID, PACKET_V9_TEMPLATE, RNG.choice(PACKETS_V9), PACKET_INVALID,
+                RNG.choice(PACKETS_V9), PACKET_INVALID
             ])
         self.assertEqual(len(pkts), 3)
 
     def test_recv_v1_packet(self):
         """Test NetFlow v1 packet parsing"""
-        pkts, _, _ = send_recv_packets([PACKET_V1])
+        pkts, _, _ = self.harness.run([PACKET_V1])
         self.assertEqual(len(pkts), 1)
 
         # Take the parsed packet and check meta data
@@ -86,15 +109,12 @@ class TestFlowExportNetflow(unittest.TestCase):
         # Check specific IP address contained in a flow.
         # Since it might vary which flow of the pair is epxorted first, check both
         flow = p.export.flows[0]
-        self.assertIn(
-            ipaddress.ip_address(flow.IPV4_SRC_ADDR),  # convert to ipaddress obj because value is int
-            [ipaddress.ip_address("172.17.0.1"), ipaddress.ip_address("172.17.0.2")]
-        )
+        self.assertIn(flow.IPV4_SRC_ADDR, (_IP_172_17_0_1, _IP_172_17_0_2))
         self.assertEqual(flow.PROTO, 1)  # ICMP
 
     def test_recv_v5_packet(self):
         """Test NetFlow v5 packet parsing"""
-        pkts, _, _ = send_recv_packets([PACKET_V5])
+        pkts, _, _ = self.harness.run([PACKET_V5])
         self.assertEqual(len(pkts), 1)
 
         p = pkts[0]
@@ -106,29 +126,26 @@ class TestFlowExportNetflow(unittest.TestCase):
         # Check specific IP address contained in a flow.
         # Since it might vary which flow of the pair is epxorted first, check both
         flow = p.export.flows[0]
-        self.assertIn(
-            ipaddress.ip_address(flow.IPV4_SRC_ADDR),  # convert to ipaddress obj because value is int
-            [ipaddress.ip_address("172.17.0.1"), ipaddress.ip_address("172.17.0.2")]  # matches multicast packet too
-        )
+        self.assertIn(flow.IPV4_SRC_ADDR, (_IP_172_17_0_1, _IP_172_17_0_2))  # matches multicast packet too
         self.assertEqual(flow.PROTO, 1)  # ICMP
 
     def test_recv_v9_packet(self):
         """Test NetFlow v9 packet parsing"""
 
         # send packet without any template, must fail to parse (packets are queued)
-        pkts, _, _ = send_recv_packets([PACKETS_V9[0]])
+        pkts, _, _ = self.harness.run([PACKETS_V9[0]])
         self.assertEqual(len(pkts), 0)  # no export is parsed due to missing template
 
         # send an invalid packet with zero bytes, must fail to parse
-        pkts, _, _ = send_recv_packets([PACKET_V9_WITH_ZEROS])
+        pkts, _, _ = self.harness.run([PACKET_V9_WITH_ZEROS])
         self.assertEqual(len(pkts), 0)  # no export is parsed due to missing template
 
         # send packet with two templates and eight flows, should parse correctly since the templates are known
-        pkts, _, _ = send_recv_packets([PACKET_V9_TEMPLATE])
+        pkts, _, _ = self.harness.run([PACKET_V9_TEMPLATE])
         self.assertEqual(len(pkts), 1)
 
         # and again, but with the templates at the end in the packet
-        pkts, _, _ = send_recv_packets([PACKET_V9_TEMPLATE_MIXED])
+        pkts, _, _ = self.harness.run([PACKET_V9_TEMPLATE_MIXED])
         self.assertEqual(len(pkts), 1)
         p = pkts[0]
         self.assertEqual(p.client[0], "127.0.0.1")
@@ -146,7 +163,7 @@ class TestFlowExportNetflow(unittest.TestCase):
         self.assertEqual(flow.L4_DST_PORT, 53)
 
         # send template and multiple export packets
-        pkts, _, _ = send_recv_packets([PACKET_V9_TEMPLATE, *PACKETS_V9])
+        pkts, _, _ = self.harness.run([PACKET_V9_TEMPLATE, *PACKETS_V9])
         self.assertEqual(len(pkts), 4)
         self.assertEqual(pkts[0].export.header.version, 9)
 
@@ -155,3 +172,28 @@ class TestFlowExportNetflow(unittest.TestCase):
         for packet in pkts:
             total_flows += len(packet.export.flows)
         self.assertEqual(total_flows, 8 + 12 + 12 + 12)
+
+    def test_v9_reordered_templates_and_flows(self):
+        """Test that v9 packets parse regardless of the order of their templates and flows"""
+        for order in ("templates_first", "flows_first"):
+            for iteration in range(10):
+                templates = RNG.sample([V9_TEMPLATE_1024, V9_TEMPLATE_2048], 2)
+                flows = RNG.sample(V9_FLOWS_1024, len(V9_FLOWS_1024))
+                with self.subTest(order=order, iteration=iteration):
+                    export = parse_packet(build_v9(V9_HEADER, templates, flows, order=order),
+                                          {"netflow": {}, "ipfix": {}})
+                    self.assertEqual(len(export.flows), 8)
+                    self.assertEqual(len(export.templates), 2)
+                    self.assertEqual(sorted(f.L4_SRC_PORT for f in export.flows),
+                                     [53, 80, 80, 80, 37930, 37932, 37940, 46025])
+
+    def test_v9_templates_picklable(self):
+        """Test that parsed v9 templates can be pickled and copied, and still decode flows afterwards"""
+        templates = {"netflow": {}, "ipfix": {}}
+        parse_packet(PACKET_V9_TEMPLATE, templates)
+        for name, restored in (("pickle", pickle.loads(pickle.dumps(templates))),
+                               ("deepcopy", copy.deepcopy(templates))):
+            with self.subTest(copy=name):
+                self.assertEqual(restored["netflow"].keys(), templates["netflow"].keys())
+                export = parse_packet(PACKETS_V9[0], restored)
+                self.assertEqual(len(export.flows), 12)
@@ -5,35 +5,135 @@ This file belongs to https://github.com/bitkeks/python-netflow-v9-softflowd.
 
 Copyright 2016-2020 Dominik Pataky <software+pynetflow@dpataky.eu>
 Licensed under MIT License. See LICENSE.
+
+The tests in this file are analysis tools and skipped by default. Set NETFLOW_PERF_VERBOSE=1 for statistics per
+file and line. tracemalloc hooks all allocator domains, so it sees every allocation with the default pymalloc
+allocator too. Running with PYTHONMALLOC=malloc makes all allocations use the system allocator instead; this is
+only needed to compare against another allocator, e.g. one preloaded with LD_PRELOAD.
 """
 import cProfile
-import io
+import functools
+import gc
 import linecache
+import multiprocessing
+import os
 import pstats
+import tempfile
 import tracemalloc
 import unittest
+from typing import Optional
 
-from tests.lib import send_recv_packets, generate_packets
+import netflow.ipfix
+import netflow.v9
+from netflow import parse_packet
+from tests.lib import CollectorHarness, RNG, RNG_SEED, send_recv_packets_count, generate_packets
 
 NUM_PACKETS_PERFORMANCE = 2000
 
+# Detailed statistics per file and line are only printed if NETFLOW_PERF_VERBOSE is set to a non-empty value,
+# otherwise each statistic is summarized in a single line
+VERBOSE = bool(os.environ.get("NETFLOW_PERF_VERBOSE"))
+
+# Bound format methods for the lines of the detailed statistics, looked up once instead of once per printed line
+_FORMAT_LINENO = "\n{idx:02d}: {filename}:{lineno} {size:.1f} KiB, count {count}".format
+_FORMAT_FILENAME = "{idx:02d}: {filename:80s} {size:6.1f} KiB, count {count:5<d}".format
+
+# Number of frames stored per traced allocation. The statistics only use the innermost frame, and every additional
+# frame makes tracing slower and snapshots bigger, see "Performance" in the tracemalloc documentation.
+_NFRAME = 1
+
+# The exact paths of the parser modules, which are also the file names of their traces. Matching them as a whole
+# is cheaper than a suffix pattern with a leading wildcard.
+_IPFIX_FILE = netflow.ipfix.__file__
+_V9_FILE = netflow.v9.__file__
+
+# Allocations of the profiling and testing machinery itself, which are not of interest in the snapshots
+_NOISE_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, linecache.__file__),
+    tracemalloc.Filter(False, os.path.join(os.path.dirname(unittest.__file__), "*")),
+)
+if hasattr(tracemalloc, "DomainFilter"):  # Python 3.6+
+    # Only keep allocations of the Python memory allocators. Extension modules can trace their own buffers in
+    # other domains (numpy does for array data), which would be counted in addition to the Python objects.
+    _NOISE_FILTERS += (tracemalloc.DomainFilter(True, 0),)
+
+
+def _rss() -> Optional[int]:
+    """
+    Current resident set size of this process in KiB, read from /proc/self/statm.
+    It covers the whole process, including the test machinery and the overhead of tracemalloc.
+    :return: The RSS, or None where /proc/self/statm is not available (e.g. on macOS and Windows)
+    """
+    try:
+        with open("/proc/self/statm") as statm:
+            resident_pages = int(statm.read().split()[1])
+    except OSError:
+        return None
+    return resident_pages * os.sysconf("SC_PAGE_SIZE") // 1024
+
+
+@functools.lru_cache(maxsize=32)
+def _file_lines(filename: str) -> list:
+    """All lines of a source file, read once per file for all statistics pointing into it"""
+    return linecache.getlines(filename)
+
+
+def _snapshot_worker(version: int, snapshot_file: str, conn):
+    """
+    Collect packets of version :version: in a process of its own and dump the memory snapshot of the run.
+    The number of received packets is sent back over :conn:.
+    :return:
+    """
+    tracemalloc.start(_NFRAME)
+    packets = list(generate_packets(NUM_PACKETS_PERFORMANCE, version))
+    gc.collect()
+    gc.disable()
+    try:
+        tracemalloc.clear_traces()
+        received, t1, t2 = send_recv_packets_count(packets)
+        gc.collect()
+        tracemalloc.take_snapshot().dump(snapshot_file)
+    finally:
+        gc.enable()
+    conn.send(received)
+    conn.close()
+
 
 @unittest.skip("Not necessary in functional tests, used as analysis tool")
 class TestNetflowIPFIXPerformance(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        """
+        Start one collector for all memory measurements, then start tracemalloc profiling.
+        Tracing runs for the whole class, each test only clears the traces of the tests before it.
+        :return:
+        """
+        cls.harness = CollectorHarness()
+        cls.harness.start()
+        tracemalloc.start(_NFRAME)
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        tracemalloc.stop()
+        cls.harness.stop()
+
     def setUp(self) -> None:
         """
-        Before each test run, start tracemalloc profiling.
+        Before each test run, seed the packet generator and drop the traces of previous tests.
         :return:
         """
-        tracemalloc.start()
+        RNG.seed(RNG_SEED)
+        tracemalloc.clear_traces()
         print("\n\n")
 
-    def tearDown(self) -> None:
+    def _pause_tracing(self):
         """
-        After each test run, stop tracemalloc.
+        Stop tracemalloc for the rest of the current test, it is started again for the following tests.
         :return:
         """
         tracemalloc.stop()
+        self.addCleanup(tracemalloc.start, _NFRAME)
 
     def _memory_of_version(self, version, store_packets=500) -> tracemalloc.Snapshot:
         """
@@ -43,17 +143,42 @@ class TestNetflowIPFIXPerformance(unittest.TestCase):
         """
         if not tracemalloc.is_tracing():
             raise RuntimeError
-        pkts, t1, t2 = send_recv_packets(generate_packets(NUM_PACKETS_PERFORMANCE, version),
-                                         store_packets=store_packets)
-        self.assertEqual(len(pkts), NUM_PACKETS_PERFORMANCE)
-        snapshot = tracemalloc.take_snapshot()
-        del pkts
+        self.assertEqual(tracemalloc.get_traceback_limit(), _NFRAME)
+        # Generate all packets first, so their allocations are not part of the snapshot of the collector
+        packets = list(generate_packets(NUM_PACKETS_PERFORMANCE, version))
+
+        # The cyclic garbage collector must not run in the middle of the measured run. Garbage left over from
+        # before is collected up front, garbage of the run itself right before the snapshot.
+        gc.collect()
+        gc.disable()
+        rss_before = _rss()
+        try:
+            tracemalloc.clear_traces()
+            if store_packets == 0:
+                # Nothing is kept, so the parsed packets are only counted
+                received, t1, t2 = self.harness.run_count(packets)
+            else:
+                pkts, t1, t2 = self.harness.run(packets, store_packets=store_packets)
+                received = len(pkts)
+            gc.collect()
+            snapshot = tracemalloc.take_snapshot().filter_traces(_NOISE_FILTERS)
+        finally:
+            gc.enable()
+        self.assertEqual(received, NUM_PACKETS_PERFORMANCE)
+        # Both values are printed, because memory freed by earlier runs mostly stays with the process and is reused,
+        # so the difference alone understates runs that follow bigger ones
+        rss_after = _rss()
+        if VERBOSE and rss_before is not None and rss_after is not None:
+            print("RSS of the process before the run {} KiB, after the run {} KiB ({:+d} KiB)".format(
+                rss_before, rss_after, rss_after - rss_before
+            ))
         return snapshot
 
     @staticmethod
     def _print_memory_statistics(snapshot: tracemalloc.Snapshot, key: str, topx: int = 10):
         """
         Print memory statistics from a tracemalloc.Snapshot in certain formats.
+        Without NETFLOW_PERF_VERBOSE, only a summary line is printed.
         :param snapshot:
         :param key:
         :param topx:
@@ -63,28 +188,31 @@ class TestNetflowIPFIXPerformance(unittest.TestCase):
             raise KeyError
 
         stats = snapshot.statistics(key)
-        if key == "lineno":
+        if not VERBOSE:
+            print("Top {} of {} entries by {}: {:.1f} KiB".format(
+                min(topx, len(stats)), len(stats), key, sum(stat.size for stat in stats[:topx]) / 1024
+            ))
+        elif key == "lineno":
             for idx, stat in enumerate(stats[:topx]):
                 frame = stat.traceback[0]
-                print("\n{idx:02d}: {filename}:{lineno} {size:.1f} KiB, count {count}".format(
-                    idx=idx + 1, filename=frame.filename, lineno=frame.lineno, size=stat.size / 1024, count=stat.count
-                ))
-
-                lines = []
-                lines_whitespaces = []
-                for lineshift in range(-3, 2):
-                    stat = linecache.getline(frame.filename, frame.lineno + lineshift)
-                    lines_whitespaces.append(len(stat) - len(stat.lstrip(" ")))  # count
-                    lines.append(stat.strip())
-                lines_whitespaces = [x - min([y for y in lines_whitespaces if y > 0]) for x in lines_whitespaces]
-                for lidx, stat in enumerate(lines):
-                    print("   {}{}".format("> " if lidx == 3 else "| ", " " * lines_whitespaces.pop(0) + stat))
+                print(_FORMAT_LINENO(idx=idx + 1, filename=frame.filename, lineno=frame.lineno,
+                                     size=stat.size / 1024, count=stat.count))
+
+                # The three lines before the traced line, the line itself and the line after it,
+                # as (is_traced_line, leading_whitespaces, stripped_line) tuples
+                first = max(frame.lineno - 4, 0)
+                context = [
+                    (lineno == frame.lineno, len(line) - len(line.lstrip(" ")), line.strip())
+                    for lineno, line in enumerate(_file_lines(frame.filename)[first:frame.lineno + 1], first + 1)
+                ]
+                # Sources which are not files (e.g. "<string>") have no lines, then there is nothing to dedent
+                min_whitespaces = min((ws for _, ws, _ in context if ws > 0), default=0)
+                for is_traced, ws, line in context:
+                    print("   {}{}".format("> " if is_traced else "| ", " " * (ws - min_whitespaces) + line))
         elif key == "filename":
             for idx, stat in enumerate(stats[:topx]):
                 frame = stat.traceback[0]
-                print("{idx:02d}: {filename:80s} {size:6.1f} KiB, count {count:5<d}".format(
-                    idx=idx + 1, filename=frame.filename, size=stat.size / 1024, count=stat.count
-                ))
+                print(_FORMAT_FILENAME(idx=idx + 1, filename=frame.filename, size=stat.size / 1024, count=stat.count))
 
     def test_compare_memory(self):
         """
@@ -93,50 +221,37 @@ class TestNetflowIPFIXPerformance(unittest.TestCase):
         TODO: more features could be tested, e.g. too big of a difference if one version is optimized better
         :return:
         """
-        pkts, t1, t2 = send_recv_packets(generate_packets(NUM_PACKETS_PERFORMANCE, 10))
-        self.assertEqual(len(pkts), NUM_PACKETS_PERFORMANCE)
-        snapshot_ipfix = tracemalloc.take_snapshot()
-        del pkts
-        tracemalloc.clear_traces()
-
-        pkts, t1, t2 = send_recv_packets(generate_packets(NUM_PACKETS_PERFORMANCE, 9))
-        self.assertEqual(len(pkts), NUM_PACKETS_PERFORMANCE)
-        snapshot_v9 = tracemalloc.take_snapshot()
-        del pkts
-
-        stats = snapshot_v9.compare_to(snapshot_ipfix, "lineno")
-        for stat in stats:
-            if stat.traceback[0].filename.endswith("netflow/ipfix.py"):
-                self.assertEqual(stat.count, 0)
-                self.assertEqual(stat.size, 0)
+        # Both runs are independent of each other, so they are done at the same time in separate processes.
+        # Each collector binds to its own ephemeral port. "spawn" starts the workers without the tracing state
+        # and the collector of this process. This process itself only compares the snapshots, without tracing.
+        self._pause_tracing()
+        ctx = multiprocessing.get_context("spawn")
+        with tempfile.TemporaryDirectory() as tmpdir:
+            workers = []
+            for version in (10, 9):
+                snapshot_file = os.path.join(tmpdir, "v{}.snapshot".format(version))
+                recv_conn, send_conn = ctx.Pipe(duplex=False)
+                process = ctx.Process(target=_snapshot_worker, args=(version, snapshot_file, send_conn))
+                process.start()
+                send_conn.close()  # only the worker writes to it
+                workers.append((process, recv_conn, snapshot_file))
 
-        stats = snapshot_ipfix.compare_to(snapshot_v9, "lineno")
-        for stat in stats:
-            if stat.traceback[0].filename.endswith("netflow/v9.py"):
-                self.assertEqual(stat.count, 0)
-                self.assertEqual(stat.size, 0)
+            snapshots = []
+            for process, recv_conn, snapshot_file in workers:
+                self.assertEqual(recv_conn.recv(), NUM_PACKETS_PERFORMANCE)
+                process.join()
+                self.assertEqual(process.exitcode, 0)
+                snapshots.append(tracemalloc.Snapshot.load(snapshot_file))
+            snapshot_ipfix, snapshot_v9 = snapshots
 
-    def test_memory_ipfix(self):
-        """
-        Test memory usage of the collector with IPFIX packets.
-        Three iterations are done with different amounts of packets to be stored.
-        With this approach, increased usage of memory can be captured when the ExportPacket objects are not deleted.
-        :return:
-        """
-        for store_pkts in [0, 500, -1]:  # -1 is compatibility value for "store all"
-            snapshot_ipfix = self._memory_of_version(10, store_packets=store_pkts)
+        # Only keep the traces of the library which was not used in the run, before the snapshots are compared
+        filter_ipfix = [tracemalloc.Filter(True, _IPFIX_FILE)]
+        stats = snapshot_v9.filter_traces(filter_ipfix).compare_to(snapshot_ipfix.filter_traces(filter_ipfix), "lineno")
+        self.assertTrue(all(stat.count == 0 and stat.size == 0 for stat in stats))
 
-            # TODO: this seems misleading, maybe reads the memory of the whole testing process?
-            # system_memory = pathlib.Path("/proc/self/statm").read_text()
-            # pagesize = resource.getpagesize()
-            # print("Total RSS memory used: {:.1f} KiB".format(int(system_memory.split()[1]) * pagesize // 1024.))
-
-            print("\nIPFIX memory usage with {} packets being stored".format(store_pkts))
-            self._print_memory_statistics(snapshot_ipfix, "filename")
-            if store_pkts == -1:
-                # very verbose and most interesting in iteration with all ExportPackets being stored in memory
-                print("\nTraceback for run with all packets being stored in memory")
-                self._print_memory_statistics(snapshot_ipfix, "lineno")
+        filter_v9 = [tracemalloc.Filter(True, _V9_FILE)]
+        stats = snapshot_ipfix.filter_traces(filter_v9).compare_to(snapshot_v9.filter_traces(filter_v9), "lineno")
+        self.assertTrue(all(stat.count == 0 and stat.size == 0 for stat in stats))
 
     def test_memory_v1(self):
         """
@@ -156,33 +271,52 @@ class TestNetflowIPFIXPerformance(unittest.TestCase):
         print("\nNetFlow v5 memory usage by file")
         self._print_memory_statistics(snapshot_v5, "filename")
 
-    def test_memory_v9(self):
+    def test_memory_ipfix_v9(self):
         """
-        Test memory usage of the collector with NetFlow v9 packets.
+        Test memory usage of the collector with IPFIX and NetFlow v9 packets, using the same collector.
+        For IPFIX, three iterations are done with different amounts of packets to be stored.
+        With this approach, increased usage of memory can be captured when the ExportPacket objects are not deleted.
         :return:
         """
-        snapshot_v9 = self._memory_of_version(9)
-        print("\nNetFlow v9 memory usage by file")
-        self._print_memory_statistics(snapshot_v9, "filename")
-        print("\nNetFlow v9 memory usage by line")
-        self._print_memory_statistics(snapshot_v9, "lineno")
+        runs = [
+            ("IPFIX", 10, [0, 500, -1]),  # -1 is compatibility value for "store all"
+            ("NetFlow v9", 9, [500]),
+        ]
+
+        for name, version, store_variants in runs:
+            for store_pkts in store_variants:
+                with self.subTest(version=version, store_packets=store_pkts):
+                    snapshot = self._memory_of_version(version, store_packets=store_pkts)
+                    print("\n{} memory usage with {} packets being stored".format(name, store_pkts))
+                    self._print_memory_statistics(snapshot, "filename")
+                    if store_pkts == store_variants[-1]:
+                        # very verbose and most interesting in the iteration with the most ExportPackets being stored
+                        print("\n{} memory usage by line".format(name))
+                        self._print_memory_statistics(snapshot, "lineno")
 
-    @unittest.skip("Does not work as expected due to threading")
     def test_time_ipfix(self):
         """
-        Profile function calls and CPU time.
-        TODO: this does not work with threading in the collector, yet
+        Profile function calls and CPU time of parsing IPFIX packets.
+        cProfile only profiles the thread it was enabled in, so the packets are not sent through the collector
+        (which parses them in its own thread) but parsed with parse_packet in this thread, like the collector does.
         :return:
         """
+        self._pause_tracing()  # tracing allocations would distort the measured times
+        packets = list(generate_packets(NUM_PACKETS_PERFORMANCE, 10))
+        templates = {"netflow": {}, "ipfix": {}}
+
         profile = cProfile.Profile()
         profile.enable(subcalls=True, builtins=True)
-        pkts, t1, t2 = send_recv_packets(generate_packets(NUM_PACKETS_PERFORMANCE, 10), delay=0, store_packets=500)
-        self.assertEqual(len(pkts), NUM_PACKETS_PERFORMANCE)
+        exports = [parse_packet(packet, templates) for packet in packets]
         profile.disable()
+        self.assertEqual(len(exports), NUM_PACKETS_PERFORMANCE)
 
-        for sort_by in ['cumulative', 'calls']:
-            s = io.StringIO()
-            ps = pstats.Stats(profile, stream=s)
-            ps.sort_stats(sort_by).print_stats("netflow")
-            ps.sort_stats(sort_by).print_callees(.5)
-            print(s.getvalue())
+        # Walk the profile data directly instead of formatting the whole table and filtering it afterwards.
+        # The raw stats are keyed by (filename, line number, function name), see pstats.Stats.
+        stats = pstats.Stats(profile).stats
+        functions = [(func, stat) for func, stat in stats.items() if "netflow" in func[0]]
+        functions.sort(key=lambda item: item[1][3], reverse=True)  # by cumulative time
+        for (filename, lineno, funcname), (primitive_calls, calls, tottime, cumtime, callers) in functions[:20]:
+            print("{:>8.3f}s cumulative {:>8.3f}s total {:>8d} calls  {}:{}({})".format(
+                cumtime, tottime, calls, filename, lineno, funcname
+            ))